@@ -1,11 +1,29 @@
 import datetime
 import os
-from concurrent.futures import ThreadPoolExecutor, as_completed
-
-from lib.futures_helper import run_futures_raising_failures_after_completion
+import threading
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
+
+from lib.futures_helper import (
+    run_futures_raising_failures_after_completion,
+    run_items_with_retries,
+)
 from lib.iot_manager import IoTManager
 from lib.logging import get_logger
+from lib.rate_limiter import RateLimiter
 from lib.s3_manager import S3Manager
+from lib.shadow_backup import (
+    GET_THING_SHADOW_RATE,
+    LIST_NAMED_SHADOWS_RATE,
+    SHADOW_SHARD_SIZE,
+    SHADOW_WORKERS,
+    ShadowShardWriter,
+)
+from lib.shadow_manager import ShadowManager
 
 logger = get_logger(__name__)
 
@@ -118,6 +136,83 @@ def describe_all_provisioning_templates():
             logger.debug(f"Exported provisioning template {template['templateName']}")
 
 
+def get_thing_shadows(thing_name, list_limiter, get_limiter):
+    shadow_names = [None] + ShadowManager().list_named_shadows_for_thing(
+        thing_name, limiter=list_limiter
+    )
+    documents = []
+    for shadow_name in shadow_names:
+        shadow = ShadowManager().get_thing_shadow(
+            thing_name, shadow_name, limiter=get_limiter
+        )
+        if shadow:
+            documents.append(
+                {"thingName": thing_name, "shadowName": shadow_name, "shadow": shadow}
+            )
+    return thing_name, documents
+
+
+def export_all_shadows():
+    paginator = IoTManager().get_paginator("list_things")
+    list_limiter = RateLimiter(LIST_NAMED_SHADOWS_RATE)
+    get_limiter = RateLimiter(GET_THING_SHADOW_RATE)
+    writer = ShadowShardWriter(SHADOW_SHARD_SIZE)
+    in_flight = {}
+    failed_thing_names = []
+
+    def write_completed(futures):
+        for future in futures:
+            thing_name = in_flight.pop(future)
+            try:
+                documents = future.result()[1]
+            except Exception as e:
+                logger.warning(f"Failed to export shadows of thing {thing_name}: {e}")
+                failed_thing_names.append(thing_name)
+                continue
+            writer.write_thing(thing_name, documents)
+
+    writer_lock = threading.Lock()
+
+    def retry_thing_shadows(thing_name):
+        documents = get_thing_shadows(thing_name, list_limiter, get_limiter)[1]
+        with writer_lock:
+            writer.write_thing(thing_name, documents)
+
+    # The shards and index are written for every thing that succeeded even if the listing or some things fail, so
+    # that the backup can be partially restored.
+    try:
+        # Things are submitted as they are listed and written as soon as they complete, so only a bounded number of
+        # shadow documents is held in memory at any time.
+        with ThreadPoolExecutor(max_workers=SHADOW_WORKERS) as executor:
+            try:
+                for page in paginator.paginate():
+                    for thing in page["things"]:
+                        if len(in_flight) >= SHADOW_WORKERS * 2:
+                            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                            write_completed(done)
+                        future = executor.submit(
+                            get_thing_shadows,
+                            thing["thingName"],
+                            list_limiter,
+                            get_limiter,
+                        )
+                        in_flight[future] = thing["thingName"]
+            finally:
+                done, _ = wait(in_flight)
+                write_completed(done)
+        # The listing pass counts as the first attempt, so failed things back off before they are retried
+        run_items_with_retries(
+            "shadow exports",
+            [(thing_name,) for thing_name in failed_thing_names],
+            retry_thing_shadows,
+            SHADOW_WORKERS,
+            first_attempt=2,
+        )
+    finally:
+        writer.close()
+    logger.info("Exported all shadows")
+
+
 def export_described_data():
     with ThreadPoolExecutor() as executor:
         futures = [
@@ -127,6 +222,7 @@ def export_described_data():
             executor.submit(describe_all_thing_types),
             executor.submit(describe_all_policies),
             executor.submit(describe_all_provisioning_templates),
+            executor.submit(export_all_shadows),
         ]
         try:
             run_futures_raising_failures_after_completion(futures)
@@ -140,6 +236,7 @@ if __name__ == "__main__":
     BACKUP_BUCKET = os.environ["BACKUP_BUCKET"]
     BACKUP_DATE_PREFIX = datetime.datetime.now().strftime("%Y/%m/%d")
     IoTManager().set_region(BACKUP_REGION)
+    ShadowManager().set_region(BACKUP_REGION)
     S3Manager().set_bucket(BACKUP_BUCKET)
     S3Manager().set_prefix(BACKUP_DATE_PREFIX)
     export_described_data()
@@ -0,0 +1,29 @@
+from .futures_helper import run_items_with_retries
+from .logging import get_logger
+from .rate_limiter import RateLimiter
+
+logger = get_logger(__name__)
+
+
+def flatten_assignments(assignments):
+    """Flattens a {target: [relation, ...]} map into de-duplicated (target, relation) work items, preserving order."""
+    return list(
+        dict.fromkeys(
+            (target, relation)
+            for target, relations in assignments.items()
+            for relation in relations
+        )
+    )
+
+
+def restore_associations(name, work_items, attach, existing, rate, max_workers):
+    """Calls attach(target, relation) in parallel for every work item, as returned by flatten_assignments, not
+    already present in `existing`."""
+    pending = [item for item in work_items if item not in existing]
+    logger.info(
+        f"Restoring {len(pending)} {name}, skipping {len(work_items) - len(pending)} already present"
+    )
+    run_items_with_retries(
+        name, pending, attach, max_workers, limiter=RateLimiter(rate)
+    )
+    logger.info(f"Restored all {name}")
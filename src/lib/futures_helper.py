@@ -1,4 +1,9 @@
-from concurrent.futures import as_completed
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .logging import get_logger
+
+logger = get_logger(__name__)
 
 
 def run_futures_raising_failures_after_completion(futures):
@@ -13,3 +18,49 @@ def run_futures_raising_failures_after_completion(futures):
     if failures:
         failures_message = "\n".join(str(failure) for failure in failures)
         raise Exception(f"Futures failures: {failures_message}")
+
+
+def run_items_with_retries(
+    name,
+    items,
+    func,
+    max_workers,
+    limiter=None,
+    max_attempts=3,
+    retry_delay=1,
+    first_attempt=1,
+):
+    """Calls func(*item) for every item in parallel, each call waiting on `limiter` when given. Failed items are
+    queued and retried with exponential backoff once the current round has completed, items still failing after
+    `max_attempts` rounds are raised together. Callers that already tried the items once pass first_attempt=2,
+    so that the first round backs off as well."""
+
+    def run(item):
+        if limiter:
+            limiter.wait()
+        func(*item)
+
+    pending = list(items)
+    failures = {}
+    for attempt in range(first_attempt, max_attempts + 1):
+        if not pending:
+            break
+        if attempt > 1:
+            time.sleep(retry_delay * 2 ** (attempt - 2))
+            logger.info(
+                f"Retrying {len(pending)} failed {name} items, attempt {attempt}"
+            )
+        failures = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(run, item): item for item in pending}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    failures[futures[future]] = e
+        pending = list(failures)
+    if failures:
+        failures_message = "\n".join(
+            f"{item}: {failure}" for item, failure in failures.items()
+        )
+        raise Exception(f"{name} failures: {failures_message}")
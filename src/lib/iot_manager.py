@@ -3,6 +3,10 @@ import os
 import boto3
 import botocore
 
+client_config = botocore.config.Config(
+    max_pool_connections=int(os.environ.get("IOT_MAX_POOL_CONNECTIONS", 50)),
+)
+
 
 class IoTManager:
     _region = None
@@ -21,7 +25,10 @@ class IoTManager:
 
     def set_region(self, region):
         self._instance._region = region
-        self._instance.iot_client = boto3.client("iot", region_name=region)
+        self._instance.iot_client = boto3.client(
+            "iot", region_name=region, config=client_config
+        )
+        self._instance.sts_client = boto3.client("sts", region_name=region)
 
     def replace_region_in_string(self, target):
         regions = self.get_all_regions()
@@ -38,6 +45,11 @@ class IoTManager:
     def get_all_regions(self):
         return boto3.session.Session().get_available_regions("iot")
 
+    def get_data_endpoint(self):
+        return self._instance.iot_client.describe_endpoint(
+            endpointType="iot:Data-ATS"
+        )["endpointAddress"]
+
     def get_id_from_arn(self, arn):
         return arn.split("/")[-1]
 
@@ -46,6 +58,13 @@ class IoTManager:
             "certificateDescription"
         ]["certificateArn"]
 
+    def get_cert_arn_prefix(self):
+        """Returns the ARN prefix of certificates in the current region and account, a certificate ARN being the
+        prefix followed by /<certificate id>."""
+        identity = self._instance.sts_client.get_caller_identity()
+        partition = identity["Arn"].split(":")[1]
+        return f"arn:{partition}:iot:{self.region}:{identity['Account']}:cert"
+
     def describe_thing(self, thing_name):
         return self._instance.iot_client.describe_thing(thingName=thing_name)
 
@@ -73,6 +92,36 @@ class IoTManager:
     def list_attached_policies(self, target):
         return self._instance.iot_client.list_attached_policies(target=target)
 
+    def list_targets_for_policy(self, policy_name):
+        paginator = self._instance.iot_client.get_paginator("list_targets_for_policy")
+        try:
+            return [
+                target
+                for page in paginator.paginate(policyName=policy_name)
+                for target in page["targets"]
+            ]
+        except botocore.exceptions.ClientError as e:
+            if e.response["Error"]["Code"] == "ResourceNotFoundException":
+                return []
+            else:
+                raise
+
+    def list_things_in_thing_group(self, thing_group_name):
+        paginator = self._instance.iot_client.get_paginator(
+            "list_things_in_thing_group"
+        )
+        try:
+            return [
+                thing
+                for page in paginator.paginate(thingGroupName=thing_group_name)
+                for thing in page["things"]
+            ]
+        except botocore.exceptions.ClientError as e:
+            if e.response["Error"]["Code"] == "ResourceNotFoundException":
+                return []
+            else:
+                raise
+
     def thing_exists(self, thing_name):
         try:
             self._instance.iot_client.describe_thing(thingName=thing_name)
@@ -0,0 +1,21 @@
+import threading
+import time
+
+
+class RateLimiter:
+    """Thread safe limiter letting through at most `rate` calls per second."""
+
+    def __init__(self, rate):
+        self._interval = 1.0 / rate
+        self._lock = threading.Lock()
+        self._next_slot = time.monotonic()
+
+    def wait(self):
+        """Blocks the calling thread until its reserved slot is reached."""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next_slot, now)
+            self._next_slot = slot + self._interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
@@ -47,6 +47,28 @@ class S3Manager:
             Body=json.dumps(data, indent=2, default=serialize_datetime),
         )
 
+    def upload_raw(self, key, body):
+        """Uploads the given bytes to S3 bucket with the given key, without serializing them."""
+        key = f"{self.prefix}/{key}"
+        self._instance.s3_client.put_object(Bucket=self.bucket, Key=key, Body=body)
+
+    def get_raw(self, key):
+        """Downloads the object from S3 bucket with the given key and returns its bytes."""
+        key = f"{self.prefix}/{key}"
+        response = self._instance.s3_client.get_object(Bucket=self.bucket, Key=key)
+        return response["Body"].read()
+
+    def exists(self, key):
+        key = f"{self.prefix}/{key}"
+        try:
+            self._instance.s3_client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except botocore.exceptions.ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+                return False
+            else:
+                raise
+
     def get(self, key, without_prefix=False):
         """Downloads the object from S3 bucket with the given key and deserializes it from JSON."""
         if not without_prefix:
@@ -0,0 +1,108 @@
+import gzip
+import io
+import json
+import os
+
+from .datetime_serializer import serialize_datetime
+from .futures_helper import run_items_with_retries
+from .logging import get_logger
+from .s3_manager import S3Manager
+from .shadow_manager import ShadowManager
+
+logger = get_logger(__name__)
+
+SHADOW_INDEX_KEY = "shadows/index.json"
+SHADOW_WORKERS = int(os.environ.get("SHADOW_WORKERS", 64))
+SHADOW_SHARD_SIZE = int(os.environ.get("SHADOW_SHARD_SIZE", 5000))
+SHADOW_RESTORE_SHARDS = int(os.environ.get("SHADOW_RESTORE_SHARDS", 4))
+LIST_NAMED_SHADOWS_RATE = int(os.environ.get("LIST_NAMED_SHADOWS_RATE", 10))
+GET_THING_SHADOW_RATE = int(os.environ.get("GET_THING_SHADOW_RATE", 1000))
+UPDATE_THING_SHADOW_RATE = int(os.environ.get("UPDATE_THING_SHADOW_RATE", 1000))
+
+
+class ShadowShardWriter:
+    """Streams shadow documents into gzipped JSON lines shards, uploading each shard once it holds
+    `shard_size` documents. All shadows of a thing are kept in the same shard, the index maps each thing name to
+    its shard key."""
+
+    def __init__(self, shard_size):
+        self._shard_size = shard_size
+        self._shard_number = 0
+        self._index = {}
+        self._open_shard()
+
+    @property
+    def _key(self):
+        return f"shadows/shard-{self._shard_number:05d}.jsonl.gz"
+
+    def _open_shard(self):
+        self._buffer = io.BytesIO()
+        self._gzip = gzip.GzipFile(fileobj=self._buffer, mode="wb")
+        self._documents = 0
+
+    def _upload_shard(self):
+        self._gzip.close()
+        if self._documents:
+            S3Manager().upload_raw(self._key, self._buffer.getvalue())
+            logger.debug(f"Exported shadow shard {self._key}")
+
+    def write_thing(self, thing_name, documents):
+        if not documents:
+            return
+        for document in documents:
+            line = json.dumps(document, default=serialize_datetime) + "\n"
+            self._gzip.write(line.encode("utf-8"))
+        self._index[thing_name] = self._key
+        self._documents += len(documents)
+        if self._documents >= self._shard_size:
+            self._upload_shard()
+            self._shard_number += 1
+            self._open_shard()
+
+    def close(self):
+        """Uploads the last shard and the index."""
+        self._upload_shard()
+        S3Manager().upload(SHADOW_INDEX_KEY, self._index)
+
+
+def get_shadow_index():
+    """Returns the {thing name: shard key} index, or None for backups taken without shadows."""
+    if not S3Manager().exists(SHADOW_INDEX_KEY):
+        return None
+    return S3Manager().get(SHADOW_INDEX_KEY)
+
+
+def read_shadow_shard(key):
+    data = gzip.decompress(S3Manager().get_raw(key)).decode("utf-8")
+    return [json.loads(line) for line in data.splitlines() if line]
+
+
+def shadow_update_payload(shadow):
+    """Builds an update payload from an exported shadow document. Only the desired and reported states can be
+    written back, version, metadata and delta are generated by the service."""
+    state = {
+        key: value
+        for key, value in shadow.get("state", {}).items()
+        if key in ("desired", "reported")
+    }
+    if not state:
+        return None
+    return json.dumps({"state": state})
+
+
+def restore_shadow_documents(documents, limiter, max_workers=SHADOW_WORKERS):
+    """Writes the documents back through update_thing_shadow in parallel, skipping documents without a desired or
+    reported state. All callers restoring at the same time should share `limiter`."""
+    items = []
+    for document in documents:
+        payload = shadow_update_payload(document["shadow"])
+        if payload:
+            items.append((document["thingName"], document["shadowName"], payload))
+
+    def restore_shadow(thing_name, shadow_name, payload):
+        ShadowManager().update_thing_shadow(thing_name, shadow_name, payload)
+        logger.debug(f"Restored shadow {shadow_name or 'classic'} of thing {thing_name}")
+
+    run_items_with_retries(
+        "shadows", items, restore_shadow, max_workers, limiter=limiter
+    )
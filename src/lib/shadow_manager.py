@@ -0,0 +1,72 @@
+import json
+import os
+
+import boto3
+import botocore
+
+from .iot_manager import IoTManager
+
+client_config = botocore.config.Config(
+    max_pool_connections=int(os.environ.get("IOT_DATA_MAX_POOL_CONNECTIONS", 100)),
+)
+
+
+class ShadowManager:
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            cls._instance = super(ShadowManager, cls).__new__(cls)
+        return cls._instance
+
+    def set_region(self, region):
+        """Creates the data plane client. IOT_DATA_ENDPOINT overrides the account endpoint, e.g. to point at a
+        local stand-in."""
+        endpoint_url = os.environ.get("IOT_DATA_ENDPOINT")
+        if not endpoint_url:
+            endpoint_url = f"https://{IoTManager().get_data_endpoint()}"
+        self._instance.iot_data_client = boto3.client(
+            "iot-data",
+            region_name=region,
+            endpoint_url=endpoint_url,
+            config=client_config,
+        )
+
+    def list_named_shadows_for_thing(self, thing_name, limiter=None):
+        shadow_names = []
+        params = {"thingName": thing_name}
+        while True:
+            if limiter:
+                limiter.wait()
+            response = self._instance.iot_data_client.list_named_shadows_for_thing(
+                **params
+            )
+            shadow_names.extend(response.get("results", []))
+            if not response.get("nextToken"):
+                return shadow_names
+            params["nextToken"] = response["nextToken"]
+
+    def get_thing_shadow(self, thing_name, shadow_name=None, limiter=None):
+        """Returns the shadow document, or None if the thing has no such shadow. A shadow_name of None refers to
+        the classic shadow."""
+        params = {"thingName": thing_name}
+        if shadow_name:
+            # Boto3 does not allow sending None as a parameter, so we construct parameters this way
+            params["shadowName"] = shadow_name
+        if limiter:
+            limiter.wait()
+        try:
+            response = self._instance.iot_data_client.get_thing_shadow(**params)
+        except botocore.exceptions.ClientError as e:
+            if e.response["Error"]["Code"] == "ResourceNotFoundException":
+                return None
+            else:
+                raise
+        return json.loads(response["payload"].read().decode("utf-8"))
+
+    def update_thing_shadow(self, thing_name, shadow_name, payload):
+        params = {"thingName": thing_name, "payload": payload}
+        if shadow_name:
+            # Boto3 does not allow sending None as a parameter, so we construct parameters this way
+            params["shadowName"] = shadow_name
+        self._instance.iot_data_client.update_thing_shadow(**params)
@@ -1,13 +1,31 @@
 import os
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, wait
 
+from lib.association_engine import flatten_assignments, restore_associations
 from lib.futures_helper import run_futures_raising_failures_after_completion
 from lib.iot_manager import IoTManager
 from lib.logging import get_logger
+from lib.rate_limiter import RateLimiter
 from lib.s3_manager import S3Manager
+from lib.shadow_backup import (
+    SHADOW_RESTORE_SHARDS,
+    SHADOW_WORKERS,
+    UPDATE_THING_SHADOW_RATE,
+    get_shadow_index,
+    read_shadow_shard,
+    restore_shadow_documents,
+)
+from lib.shadow_manager import ShadowManager
 
 logger = get_logger(__name__)
 
+ASSOCIATION_WORKERS = int(os.environ.get("ASSOCIATION_WORKERS", 16))
+ATTACH_POLICY_RATE = int(os.environ.get("ATTACH_POLICY_RATE", 15))
+ATTACH_THING_PRINCIPAL_RATE = int(os.environ.get("ATTACH_THING_PRINCIPAL_RATE", 100))
+ADD_THING_TO_THING_GROUP_RATE = int(
+    os.environ.get("ADD_THING_TO_THING_GROUP_RATE", 100)
+)
+
 
 def restore_certs():
     def restore_cert(cert_details, _):
@@ -81,37 +99,109 @@ def restore_provisioning_templates():
 
 def restore_policy_assignments():
     policy_assignments = S3Manager().get("policy-assignments.json")
-    for cert_id, policies in policy_assignments.items():
-        for policy in policies:
-            IoTManager().attach_policy(
-                IoTManager().get_cert_arn(cert_id), policy["policyName"]
-            )
-            logger.debug(
-                f"Restored policy assignment {policy['policyName']} to cert {cert_id}"
-            )
+    work_items = flatten_assignments(
+        {
+            cert_id: [policy["policyName"] for policy in policies]
+            for cert_id, policies in policy_assignments.items()
+        }
+    )
+    existing = {
+        (IoTManager().get_id_from_arn(target), policy_name)
+        for policy_name in {policy_name for _, policy_name in work_items}
+        for target in IoTManager().list_targets_for_policy(policy_name)
+    }
+    # Building the ARNs avoids a describe_certificate call per cert, which has a far lower limit than attach_policy
+    cert_arn_prefix = IoTManager().get_cert_arn_prefix()
+
+    def restore_policy_assignment(cert_id, policy_name):
+        IoTManager().attach_policy(f"{cert_arn_prefix}/{cert_id}", policy_name)
+        logger.debug(f"Restored policy assignment {policy_name} to cert {cert_id}")
+
+    restore_associations(
+        "policy assignments",
+        work_items,
+        restore_policy_assignment,
+        existing,
+        rate=ATTACH_POLICY_RATE,
+        max_workers=ASSOCIATION_WORKERS,
+    )
 
 
 def restore_principal_assignments():
     principal_assignments = S3Manager().get("principals-assignments.json")
-    for thing_name, certs_arns in principal_assignments.items():
-        for cert_arn in certs_arns:
-            IoTManager().attach_thing_principal(cert_arn, thing_name)
-            logger.debug(
-                f"Restored principal assignment {thing_name} to cert {cert_arn}"
-            )
+    work_items = flatten_assignments(principal_assignments)
+
+    def restore_principal_assignment(thing_name, cert_arn):
+        IoTManager().attach_thing_principal(cert_arn, thing_name)
+        logger.debug(f"Restored principal assignment {thing_name} to cert {cert_arn}")
+
+    # Principals can only be listed per thing or per cert, which would cost as many calls as attaching them. The
+    # attach call is idempotent, so nothing is pre-listed here.
+    restore_associations(
+        "principal assignments",
+        work_items,
+        restore_principal_assignment,
+        set(),
+        rate=ATTACH_THING_PRINCIPAL_RATE,
+        max_workers=ASSOCIATION_WORKERS,
+    )
 
 
 def restore_thing_group_assignments():
     thing_groups = S3Manager().get("thing_groups.json")
-    for thing_group in thing_groups:
-        things_in_group = S3Manager().get(
-            f"thing_groups/{thing_group['thingGroupName']}.json"
+    thing_group_names = [thing_group["thingGroupName"] for thing_group in thing_groups]
+    work_items = flatten_assignments(
+        {
+            thing_group_name: S3Manager().get(f"thing_groups/{thing_group_name}.json")
+            for thing_group_name in thing_group_names
+        }
+    )
+    existing = {
+        (thing_group_name, thing)
+        for thing_group_name in thing_group_names
+        for thing in IoTManager().list_things_in_thing_group(thing_group_name)
+    }
+
+    def restore_thing_group_assignment(thing_group_name, thing):
+        IoTManager().add_thing_to_thing_group(thing_group_name, thing)
+        logger.debug(
+            f"Restored thing group assignment {thing} to group {thing_group_name}"
         )
-        for thing in things_in_group:
-            IoTManager().add_thing_to_thing_group(thing_group["thingGroupName"], thing)
-            logger.debug(
-                f"Restored thing group assignment {thing} to group {thing_group['thingGroupName']}"
-            )
+
+    restore_associations(
+        "thing group assignments",
+        work_items,
+        restore_thing_group_assignment,
+        existing,
+        rate=ADD_THING_TO_THING_GROUP_RATE,
+        max_workers=ASSOCIATION_WORKERS,
+    )
+
+
+def restore_shadows():
+    shadow_index = get_shadow_index()
+    if shadow_index is None:
+        logger.info("Backup contains no shadows, skipping")
+        return
+    limiter = RateLimiter(UPDATE_THING_SHADOW_RATE)
+
+    def restore_shadow_shard(shard_key):
+        restore_shadow_documents(
+            read_shadow_shard(shard_key),
+            limiter,
+            max_workers=max(1, SHADOW_WORKERS // SHADOW_RESTORE_SHARDS),
+        )
+        logger.debug(f"Restored shadow shard {shard_key}")
+
+    # Shards are restored in parallel and share the update rate limit. A shard with failing documents does not stop
+    # the others, all failures are reported once every shard has been processed.
+    with ThreadPoolExecutor(max_workers=SHADOW_RESTORE_SHARDS) as executor:
+        futures = [
+            executor.submit(restore_shadow_shard, shard_key)
+            for shard_key in sorted(set(shadow_index.values()))
+        ]
+        run_futures_raising_failures_after_completion(futures)
+    logger.info("Restored all shadows")
 
 
 def restore_all():
@@ -123,14 +213,19 @@ def restore_all():
             executor.submit(restore_thing_groups),
             executor.submit(restore_provisioning_templates),
         ]
+        # Assignments pre-list what already exists and attach at full speed, so they only start once every
+        # resource they refer to has been created. A failed creation step is reported with the assignments.
+        wait(resource_creation_futures)
         resource_matching_futures = [
             executor.submit(restore_policy_assignments),
             executor.submit(restore_principal_assignments),
             executor.submit(restore_thing_group_assignments),
+            executor.submit(restore_shadows),
         ]
         try:
-            run_futures_raising_failures_after_completion(resource_creation_futures)
-            run_futures_raising_failures_after_completion(resource_matching_futures)
+            run_futures_raising_failures_after_completion(
+                resource_creation_futures + resource_matching_futures
+            )
         except Exception as e:
             logger.error(f"Failed to export data: {e}")
             raise
@@ -141,6 +236,7 @@ if __name__ == "__main__":
     BACKUP_DATE_PREFIX = os.environ["BACKUP_DATE_PREFIX"]
     RESTORE_REGION = os.environ["RESTORE_REGION"]
     IoTManager().set_region(RESTORE_REGION)
+    ShadowManager().set_region(RESTORE_REGION)
     S3Manager().set_bucket(BACKUP_BUCKET)
     S3Manager().set_prefix(BACKUP_DATE_PREFIX)
     restore_all()
@@ -2,7 +2,15 @@ import os
 import sys
 
 from lib.iot_manager import IoTManager
+from lib.rate_limiter import RateLimiter
 from lib.s3_manager import S3Manager
+from lib.shadow_backup import (
+    UPDATE_THING_SHADOW_RATE,
+    get_shadow_index,
+    read_shadow_shard,
+    restore_shadow_documents,
+)
+from lib.shadow_manager import ShadowManager
 
 
 def ensure_certificates(thing_name):
@@ -57,6 +65,18 @@ def ensure_thing_type(thing_type):
         )
 
 
+def ensure_shadows(thing_name):
+    shadow_index = get_shadow_index()
+    if not shadow_index or thing_name not in shadow_index:
+        return
+    documents = [
+        document
+        for document in read_shadow_shard(shadow_index[thing_name])
+        if document["thingName"] == thing_name
+    ]
+    restore_shadow_documents(documents, RateLimiter(UPDATE_THING_SHADOW_RATE))
+
+
 def restore_thing(thing_name):
     if IoTManager().thing_exists(thing_name):
         sys.exit(f"Thing {thing_name} already exists, exiting")
@@ -71,6 +91,7 @@ def restore_thing(thing_name):
     )
     ensure_certificates(thing_name)
     ensure_thing_groups(thing_name)
+    ensure_shadows(thing_name)
 
 
 if __name__ == "__main__":
@@ -79,6 +100,7 @@ if __name__ == "__main__":
     BACKUP_DATE_PREFIX = os.environ["BACKUP_DATE_PREFIX"]
     RESTORE_REGION = os.environ["RESTORE_REGION"]
     IoTManager().set_region(RESTORE_REGION)
+    ShadowManager().set_region(RESTORE_REGION)
     S3Manager().set_bucket(BACKUP_BUCKET)
     S3Manager().set_prefix(BACKUP_DATE_PREFIX)
     restore_thing(thing_name)
@@ -0,0 +1,55 @@
+import io
+
+import botocore.exceptions
+
+
+def client_error(code, operation_name):
+    return botocore.exceptions.ClientError(
+        {"Error": {"Code": code, "Message": code}}, operation_name
+    )
+
+
+class FakeS3:
+    def __init__(self, objects=None):
+        self.objects = objects or {}
+
+    def put_object(self, Bucket, Key, Body):
+        self.objects[Key] = Body if isinstance(Body, bytes) else Body.encode("utf-8")
+
+    def get_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise client_error("NoSuchKey", "GetObject")
+        return {"Body": io.BytesIO(self.objects[Key])}
+
+    def head_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise client_error("404", "HeadObject")
+
+
+class FakePaginator:
+    """Pages through `items[key]` two at a time, `key` being the value of the given paginate parameter. Unknown keys
+    raise ResourceNotFoundException, like the IoT API does for missing policies and thing groups."""
+
+    def __init__(self, operation_name, parameter, result_key, items):
+        self.operation_name = operation_name
+        self.parameter = parameter
+        self.result_key = result_key
+        self.items = items
+        self.calls = []
+
+    def paginate(self, **params):
+        key = params.get(self.parameter)
+        self.calls.append(key)
+        if key not in self.items:
+            raise client_error("ResourceNotFoundException", self.operation_name)
+        items = self.items[key]
+        for i in range(0, max(len(items), 1), 2):
+            yield {self.result_key: items[i : i + 2]}
+
+
+class FakeSTS:
+    def get_caller_identity(self):
+        return {
+            "Account": "123456789012",
+            "Arn": "arn:aws:iam::123456789012:user/backup",
+        }
@@ -0,0 +1,288 @@
+import json
+import threading
+import time
+import unittest
+from unittest import mock
+
+import botocore.exceptions
+
+import restore_all
+from fakes import FakePaginator, FakeS3, FakeSTS, client_error
+from lib.association_engine import flatten_assignments, restore_associations
+from lib.futures_helper import run_items_with_retries
+from lib.iot_manager import IoTManager
+from lib.rate_limiter import RateLimiter
+from lib.s3_manager import S3Manager
+
+CERT_ARN_PREFIX = "arn:aws:iot:eu-west-1:123456789012:cert"
+
+
+class FakeIoT:
+    def __init__(self, paginators=()):
+        self.paginators = {
+            paginator.operation_name: paginator for paginator in paginators
+        }
+        self.lock = threading.Lock()
+        self.attached_policies = []
+        self.thing_group_members = []
+
+    def get_paginator(self, operation_name):
+        return self.paginators[operation_name]
+
+    def attach_policy(self, policyName, target):
+        with self.lock:
+            self.attached_policies.append((target, policyName))
+
+    def add_thing_to_thing_group(self, thingGroupName, thingName):
+        with self.lock:
+            self.thing_group_members.append((thingGroupName, thingName))
+
+
+def use_iot_client(client):
+    IoTManager().iot_client = client
+    IoTManager().sts_client = FakeSTS()
+    IoTManager()._region = "eu-west-1"
+
+
+def use_backup(objects):
+    S3Manager().s3_client = FakeS3(
+        {
+            f"2024/03/12/{key}": json.dumps(value).encode("utf-8")
+            for key, value in objects.items()
+        }
+    )
+    S3Manager().set_bucket("bucket")
+    S3Manager().set_prefix("2024/03/12")
+
+
+class FlattenAssignmentsTest(unittest.TestCase):
+    def test_dedupes_preserving_order(self):
+        self.assertEqual(
+            [("b", "p1"), ("b", "p2"), ("a", "p1")],
+            flatten_assignments({"b": ["p1", "p2", "p1"], "a": ["p1"], "c": []}),
+        )
+
+
+@mock.patch("lib.futures_helper.time.sleep")
+class RestoreAssociationsTest(unittest.TestCase):
+    def test_skips_existing_items(self, _):
+        attached = []
+
+        restore_associations(
+            "test",
+            [("a", 1), ("a", 2), ("b", 1)],
+            lambda target, relation: attached.append((target, relation)),
+            {("a", 2)},
+            rate=1000,
+            max_workers=2,
+        )
+
+        self.assertCountEqual([("a", 1), ("b", 1)], attached)
+
+
+@mock.patch("lib.futures_helper.time.sleep")
+class RunItemsWithRetriesTest(unittest.TestCase):
+    def test_requeues_failed_items(self, sleep):
+        calls = []
+
+        def func(item):
+            calls.append(item)
+            if item == "flaky" and calls.count(item) < 3:
+                raise Exception("throttled")
+
+        run_items_with_retries("test", [("ok",), ("flaky",)], func, max_workers=2)
+
+        self.assertEqual(1, calls.count("ok"))
+        self.assertEqual(3, calls.count("flaky"))
+        self.assertEqual([mock.call(1), mock.call(2)], sleep.call_args_list)
+
+    def test_raises_failures_once_attempts_run_out(self, sleep):
+        calls = []
+
+        def func(item):
+            calls.append(item)
+            if item == "broken":
+                raise Exception("access denied")
+
+        with self.assertRaisesRegex(
+            Exception, r"test failures: \('broken',\): access denied"
+        ):
+            run_items_with_retries(
+                "test", [("ok",), ("broken",)], func, max_workers=2
+            )
+
+        self.assertEqual(["broken"] * 3, [item for item in calls if item == "broken"])
+
+    def test_backs_off_before_first_round_when_resuming(self, sleep):
+        run_items_with_retries(
+            "test", [("item",)], lambda item: None, max_workers=1, first_attempt=2
+        )
+
+        self.assertEqual([mock.call(1)], sleep.call_args_list)
+
+
+class RateLimiterTest(unittest.TestCase):
+    @mock.patch("lib.rate_limiter.time.sleep")
+    @mock.patch("lib.rate_limiter.time.monotonic", return_value=100.0)
+    def test_spaces_calls(self, _, sleep):
+        limiter = RateLimiter(10)
+
+        for _ in range(3):
+            limiter.wait()
+
+        delays = [call.args[0] for call in sleep.call_args_list]
+        self.assertEqual(2, len(delays))
+        self.assertAlmostEqual(0.1, delays[0])
+        self.assertAlmostEqual(0.2, delays[1])
+
+
+class IoTManagerListingTest(unittest.TestCase):
+    def setUp(self):
+        use_iot_client(
+            FakeIoT(
+                [
+                    FakePaginator(
+                        "list_targets_for_policy",
+                        "policyName",
+                        "targets",
+                        {"device": ["arn:1", "arn:2", "arn:3"]},
+                    ),
+                    FakePaginator(
+                        "list_things_in_thing_group",
+                        "thingGroupName",
+                        "things",
+                        {"lamps": ["lamp-1", "lamp-2", "lamp-3"]},
+                    ),
+                ]
+            )
+        )
+
+    def test_list_targets_for_policy_reads_all_pages(self):
+        self.assertEqual(
+            ["arn:1", "arn:2", "arn:3"], IoTManager().list_targets_for_policy("device")
+        )
+
+    def test_list_targets_for_missing_policy_is_empty(self):
+        self.assertEqual([], IoTManager().list_targets_for_policy("missing"))
+
+    def test_list_things_in_thing_group_reads_all_pages(self):
+        self.assertEqual(
+            ["lamp-1", "lamp-2", "lamp-3"],
+            IoTManager().list_things_in_thing_group("lamps"),
+        )
+
+    def test_list_things_in_missing_thing_group_is_empty(self):
+        self.assertEqual([], IoTManager().list_things_in_thing_group("missing"))
+
+    def test_other_errors_are_raised(self):
+        paginator = mock.Mock()
+        paginator.paginate.side_effect = client_error(
+            "ThrottlingException", "ListTargetsForPolicy"
+        )
+        IoTManager().iot_client = mock.Mock(get_paginator=lambda _: paginator)
+
+        with self.assertRaises(botocore.exceptions.ClientError):
+            IoTManager().list_targets_for_policy("device")
+
+
+@mock.patch("lib.futures_helper.time.sleep")
+class RestoreAssignmentsTest(unittest.TestCase):
+    def test_policy_assignments_skip_certs_already_attached(self, _):
+        use_backup(
+            {
+                "policy-assignments.json": {
+                    "cert-a": [{"policyName": "device"}, {"policyName": "device"}],
+                    "cert-b": [{"policyName": "device"}, {"policyName": "admin"}],
+                }
+            }
+        )
+        # The existing target has a different prefix than the restore region, only its certificate ID is compared
+        iot = FakeIoT(
+            [
+                FakePaginator(
+                    "list_targets_for_policy",
+                    "policyName",
+                    "targets",
+                    {"device": ["arn:aws:iot:us-east-1:123456789012:cert/cert-a"]},
+                )
+            ]
+        )
+        use_iot_client(iot)
+
+        restore_all.restore_policy_assignments()
+
+        self.assertCountEqual(
+            [
+                (f"{CERT_ARN_PREFIX}/cert-b", "device"),
+                (f"{CERT_ARN_PREFIX}/cert-b", "admin"),
+            ],
+            iot.attached_policies,
+        )
+        self.assertCountEqual(
+            ["device", "admin"], iot.paginators["list_targets_for_policy"].calls
+        )
+
+    def test_thing_group_assignments_skip_existing_members(self, _):
+        use_backup(
+            {
+                "thing_groups.json": [{"thingGroupName": "lamps"}],
+                "thing_groups/lamps.json": ["lamp-1", "lamp-2", "lamp-2"],
+            }
+        )
+        iot = FakeIoT(
+            [
+                FakePaginator(
+                    "list_things_in_thing_group",
+                    "thingGroupName",
+                    "things",
+                    {"lamps": ["lamp-1"]},
+                )
+            ]
+        )
+        use_iot_client(iot)
+
+        restore_all.restore_thing_group_assignments()
+
+        self.assertEqual([("lamps", "lamp-2")], iot.thing_group_members)
+
+
+class RestoreAllTest(unittest.TestCase):
+    def test_assignments_start_after_resources_are_created(self):
+        created = []
+        created_when_assigning = []
+
+        def create(name):
+            def step():
+                time.sleep(0.05)
+                created.append(name)
+
+            return step
+
+        def assign():
+            created_when_assigning.append(len(created))
+
+        creation_steps = [
+            "restore_policies",
+            "restore_certs",
+            "restore_things",
+            "restore_thing_groups",
+            "restore_provisioning_templates",
+        ]
+        assignment_steps = [
+            "restore_policy_assignments",
+            "restore_principal_assignments",
+            "restore_thing_group_assignments",
+            "restore_shadows",
+        ]
+        with mock.patch.multiple(
+            restore_all,
+            **{name: create(name) for name in creation_steps},
+            **{name: assign for name in assignment_steps},
+        ):
+            restore_all.restore_all()
+
+        self.assertEqual([5, 5, 5, 5], created_when_assigning)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,205 @@
+import gzip
+import io
+import json
+import unittest
+from unittest import mock
+
+import export
+import restore_all
+import restore_single
+from fakes import FakePaginator, FakeS3, client_error
+from lib.iot_manager import IoTManager
+from lib.s3_manager import S3Manager
+from lib.shadow_manager import ShadowManager
+
+
+class FakeIoTData:
+    """Stand-in for the iot-data client. Shadows are keyed by (thing name, shadow name), None being the classic
+    shadow. Named shadows are listed one per page to exercise pagination."""
+
+    def __init__(self, shadows, failing_things=()):
+        self.shadows = shadows
+        self.failing_things = set(failing_things)
+        self.updates = []
+
+    def list_named_shadows_for_thing(self, thingName, nextToken=None):
+        names = sorted(
+            shadow_name
+            for thing_name, shadow_name in self.shadows
+            if thing_name == thingName and shadow_name
+        )
+        index = int(nextToken) if nextToken else 0
+        response = {"results": names[index : index + 1]}
+        if index + 1 < len(names):
+            response["nextToken"] = str(index + 1)
+        return response
+
+    def get_thing_shadow(self, thingName, shadowName=None):
+        if thingName in self.failing_things:
+            raise client_error("InternalFailureException", "GetThingShadow")
+        if (thingName, shadowName) not in self.shadows:
+            raise client_error("ResourceNotFoundException", "GetThingShadow")
+        payload = json.dumps(self.shadows[(thingName, shadowName)]).encode("utf-8")
+        return {"payload": io.BytesIO(payload)}
+
+    def update_thing_shadow(self, **params):
+        if params["thingName"] in self.failing_things:
+            raise client_error("RequestEntityTooLargeException", "UpdateThingShadow")
+        self.updates.append(params)
+
+
+SHADOWS = {
+    ("lamp", None): {
+        "state": {"desired": {"on": True}, "reported": {"on": False}, "delta": {}},
+        "metadata": {},
+        "version": 7,
+        "timestamp": 1700000000,
+    },
+    ("lamp", "config"): {"state": {"desired": {"brightness": 80}}, "version": 2},
+    ("lamp", "firmware"): {"state": {"reported": {"version": "1.2.3"}}},
+    ("door", None): {"state": {"delta": {"locked": True}}, "version": 1},
+    ("fan", None): {"state": {"reported": {"speed": 3}}},
+}
+THING_NAMES = ["lamp", "sensor", "door", "fan"]
+
+
+@mock.patch("lib.futures_helper.time.sleep")
+class ShadowBackupTest(unittest.TestCase):
+    def setUp(self):
+        self.s3 = FakeS3()
+        S3Manager().s3_client = self.s3
+        S3Manager().set_bucket("bucket")
+        S3Manager().set_prefix("2024/03/12")
+        things = [{"thingName": thing_name} for thing_name in THING_NAMES]
+        list_things = FakePaginator("list_things", None, "things", {None: things})
+        IoTManager().iot_client = mock.Mock(get_paginator=lambda _: list_things)
+        settings = mock.patch.multiple(
+            export,
+            SHADOW_SHARD_SIZE=2,
+            LIST_NAMED_SHADOWS_RATE=1000,
+            GET_THING_SHADOW_RATE=1000,
+        )
+        settings.start()
+        self.addCleanup(settings.stop)
+
+    def use_data_client(self, client):
+        ShadowManager().iot_data_client = client
+
+    def read_index(self):
+        return json.loads(self.s3.objects["2024/03/12/shadows/index.json"])
+
+    def test_round_trip(self, _):
+        self.use_data_client(FakeIoTData(SHADOWS))
+        export.export_all_shadows()
+
+        index = self.read_index()
+        self.assertEqual({"lamp", "door", "fan"}, set(index))
+        shard = gzip.decompress(self.s3.objects[f"2024/03/12/{index['lamp']}"])
+        lamp_shadows = [
+            json.loads(line)
+            for line in shard.decode("utf-8").splitlines()
+            if json.loads(line)["thingName"] == "lamp"
+        ]
+        self.assertEqual(
+            [None, "config", "firmware"],
+            [document["shadowName"] for document in lamp_shadows],
+        )
+
+        restored = FakeIoTData({})
+        self.use_data_client(restored)
+        restore_all.restore_shadows()
+
+        self.assertCountEqual(
+            [
+                {
+                    "thingName": "lamp",
+                    "payload": json.dumps(
+                        {"state": {"desired": {"on": True}, "reported": {"on": False}}}
+                    ),
+                },
+                {
+                    "thingName": "lamp",
+                    "shadowName": "config",
+                    "payload": json.dumps({"state": {"desired": {"brightness": 80}}}),
+                },
+                {
+                    "thingName": "lamp",
+                    "shadowName": "firmware",
+                    "payload": json.dumps(
+                        {"state": {"reported": {"version": "1.2.3"}}}
+                    ),
+                },
+                {
+                    "thingName": "fan",
+                    "payload": json.dumps({"state": {"reported": {"speed": 3}}}),
+                },
+            ],
+            restored.updates,
+        )
+
+    def test_restore_single_thing(self, _):
+        self.use_data_client(FakeIoTData(SHADOWS))
+        export.export_all_shadows()
+
+        restored = FakeIoTData({})
+        self.use_data_client(restored)
+        restore_single.ensure_shadows("lamp")
+        restore_single.ensure_shadows("sensor")
+
+        self.assertEqual(
+            [None, "config", "firmware"],
+            sorted(
+                (update.get("shadowName") for update in restored.updates),
+                key=lambda name: name or "",
+            ),
+        )
+        self.assertEqual({"lamp"}, {update["thingName"] for update in restored.updates})
+
+    def test_export_writes_index_for_succeeding_things_before_raising(self, sleep):
+        self.use_data_client(FakeIoTData(SHADOWS, failing_things={"door"}))
+
+        with self.assertRaisesRegex(Exception, "shadow exports failures"):
+            export.export_all_shadows()
+
+        self.assertEqual({"lamp", "fan"}, set(self.read_index()))
+        # The listing pass is the first attempt, both retries back off first. Shorter sleeps come from the limiters.
+        backoffs = [call.args[0] for call in sleep.call_args_list if call.args[0] >= 1]
+        self.assertEqual([1, 2], backoffs)
+
+    def test_export_writes_index_when_listing_fails(self, _):
+        def paginate():
+            yield {"things": [{"thingName": "lamp"}, {"thingName": "fan"}]}
+            raise client_error("ThrottlingException", "ListThings")
+
+        IoTManager().iot_client = mock.Mock(
+            get_paginator=lambda _: mock.Mock(paginate=paginate)
+        )
+        self.use_data_client(FakeIoTData(SHADOWS))
+
+        with self.assertRaisesRegex(Exception, "ThrottlingException"):
+            export.export_all_shadows()
+
+        self.assertEqual({"lamp", "fan"}, set(self.read_index()))
+
+    def test_restore_continues_past_failing_shard(self, _):
+        self.use_data_client(FakeIoTData(SHADOWS))
+        export.export_all_shadows()
+
+        restored = FakeIoTData({}, failing_things={"lamp"})
+        self.use_data_client(restored)
+        with self.assertRaisesRegex(Exception, "shadows failures"):
+            restore_all.restore_shadows()
+
+        self.assertEqual({"fan"}, {update["thingName"] for update in restored.updates})
+
+    def test_restore_skips_backups_without_shadows(self, _):
+        restored = FakeIoTData({})
+        self.use_data_client(restored)
+
+        restore_all.restore_shadows()
+
+        self.assertEqual([], restored.updates)
+
+
+if __name__ == "__main__":
+    unittest.main()